@@ -0,0 +1,375 @@
+import numpy as np
+from constants import *
+from nodes import NodeGroup, ACCESSDIRECTIONS
+from mazedata import MazeData
+
+# Entity slots along axis 1 of the per-entity arrays.  Slot 0 is Pacman,
+# slots 1-4 are the ghosts in the same order GhostGroup updates them.
+SLOTS = [PACMAN, BLINKY, PINKY, INKY, CLYDE]
+GHOSTSLOTS = [1, 2, 3, 4]
+
+# Direction constants run from RIGHT (-2) to LEFT (2), so direction+2 is
+# used as the column index into every per-direction table.
+DIRECTIONS = np.array([UP, DOWN, LEFT, RIGHT])
+VECTORS = np.zeros((5, 2))
+VECTORS[UP+2] = (0, -1)
+VECTORS[DOWN+2] = (0, 1)
+VECTORS[LEFT+2] = (-1, 0)
+VECTORS[RIGHT+2] = (1, 0)
+
+
+class SlotName(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class BatchGame(object):
+    def __init__(self, numEnvs, level=0, seed=None):
+        self.numEnvs = numEnvs
+        self.level = level
+        self.rng = np.random.default_rng(seed)
+        self.compileMaze()
+        self.createArrays()
+        self.reset()
+
+    def compileMaze(self):
+        mazedata = MazeData()
+        mazedata.loadMaze(self.level)
+        maze = mazedata.obj
+        nodes = NodeGroup(maze.name+".txt")
+        maze.setPortalPairs(nodes)
+        maze.connectHomeNodes(nodes)
+
+        graph = nodes.getGraph()
+        self.numNodes = len(graph)
+        self.nodePositions = graph.positions
+        self.neighbors = np.full((self.numNodes, 5), -1, dtype=np.int32)
+        self.lengths = np.zeros((self.numNodes, 5))
+        for direction in DIRECTIONS:
+            self.neighbors[:, direction+2] = graph.getNeighbors(direction)
+            self.lengths[:, direction+2] = graph.getLengths(direction)
+        self.portals = graph.getNeighbors(PORTAL)
+
+        slots = [SlotName(name) for name in SLOTS]
+        ghosts = slots[1:]
+        getNode = lambda tiles: nodes.getNodeFromTiles(*tiles)
+        startNodes = [getNode(maze.pacmanStart), getNode(maze.addOffset(2, 0)),
+                      getNode(maze.addOffset(2, 3)), getNode(maze.addOffset(0, 3)),
+                      getNode(maze.addOffset(4, 3))]
+        spawnNode = getNode(maze.addOffset(2, 3))
+        nodes.denyHomeAccess(slots[0])
+        nodes.denyHomeAccessList(ghosts)
+        startNodes[3].denyAccess(RIGHT, ghosts[2])
+        startNodes[4].denyAccess(LEFT, ghosts[3])
+        maze.denyGhostsAccess(ghosts, nodes)
+
+        self.accessTemplate = np.zeros((self.numNodes, 5), dtype=np.uint8)
+        access = nodes.getAccessTable()
+        for column, direction in enumerate(ACCESSDIRECTIONS):
+            for k, name in enumerate(SLOTS):
+                allowed = (access[:, column] >> name) & 1
+                self.accessTemplate[:, direction+2] |= (allowed << k).astype(np.uint8)
+
+        self.startNodes = np.array([node.id for node in startNodes], dtype=np.int32)
+        self.pacmanStartTarget = self.neighbors[self.startNodes[0], LEFT+2]
+        self.spawnNode = spawnNode.id
+        self.homeNode = nodes.nodesLUT[nodes.homekey].id
+        # Ghosts are constructed on NodeGroup.getStartTempNode(), which stays
+        # their Ghost.homeNode for normalMode() even after setStartNode().
+        self.ghostHomeNode = nodes.getStartTempNode().id
+        fruitNode = getNode((9, 20))
+        self.fruitPosition = ((fruitNode.position + fruitNode.neighbors[RIGHT].position) / 2.0).asTuple()
+        self.fruitPoints = 100 + self.level*20
+
+        data = nodes.readMazeFile(maze.name+".txt")
+        self.pelletTemplate = np.zeros(data.shape, dtype=np.int8)
+        self.pelletTemplate[np.isin(data, ['.', '+'])] = PELLET
+        self.pelletTemplate[np.isin(data, ['P', 'p'])] = POWERPELLET
+        self.numPellets = int(np.count_nonzero(self.pelletTemplate))
+
+        self.scatterGoals = np.array([(0, 0), (0, 0), (TILEWIDTH*NCOLS, 0),
+                                      (TILEWIDTH*NCOLS, TILEHEIGHT*NROWS), (0, TILEHEIGHT*NROWS)], dtype=float)
+
+    def createArrays(self):
+        E = self.numEnvs
+        self.position = np.zeros((E, 5, 2))
+        self.progress = np.zeros((E, 5))
+        self.length = np.zeros((E, 5))
+        self.direction = np.zeros((E, 5), dtype=np.int8)
+        self.speed = np.zeros((E, 5))
+        self.node = np.zeros((E, 5), dtype=np.int32)
+        self.target = np.zeros((E, 5), dtype=np.int32)
+        self.goal = np.zeros((E, 5, 2))
+        self.randomMove = np.zeros((E, 5), dtype=bool)
+        self.points = np.zeros((E, 5), dtype=np.int32)
+        self.mode = np.zeros((E, 5), dtype=np.int8)
+        self.mainMode = np.zeros((E, 5), dtype=np.int8)
+        self.clock = np.zeros(E)
+        self.mainDeadline = np.zeros((E, 5))
+        self.freightDeadline = np.zeros((E, 5))
+        self.access = np.zeros((E, self.numNodes, 5), dtype=np.uint8)
+        self.pellets = np.zeros((E,) + self.pelletTemplate.shape, dtype=np.int8)
+        self.numEaten = np.zeros(E, dtype=np.int32)
+        self.score = np.zeros(E, dtype=np.int64)
+        self.lives = np.zeros(E, dtype=np.int32)
+        self.alive = np.zeros(E, dtype=bool)
+        self.fruitActive = np.zeros(E, dtype=bool)
+        self.fruitDeadline = np.zeros(E)
+        self.levelComplete = np.zeros(E, dtype=bool)
+        self.done = np.zeros(E, dtype=bool)
+
+    def reset(self, envs=None):
+        if envs is None:
+            envs = np.arange(self.numEnvs)
+        envs = np.asarray(envs)
+        self.access[envs] = self.accessTemplate
+        self.pellets[envs] = self.pelletTemplate
+        self.numEaten[envs] = 0
+        self.score[envs] = 0
+        self.lives[envs] = 5
+        self.fruitActive[envs] = False
+        self.clock[envs] = 0
+        self.levelComplete[envs] = False
+        self.done[envs] = False
+        self.mode[np.ix_(envs, GHOSTSLOTS)] = SCATTER
+        self.mainMode[np.ix_(envs, GHOSTSLOTS)] = SCATTER
+        self.mainDeadline[np.ix_(envs, GHOSTSLOTS)] = SCATTERTIME
+        self.resetLevel(envs)
+
+    def resetLevel(self, envs):
+        # Mirrors Pacman.reset and Ghost.reset; ghost modes carry over.
+        self.node[envs] = self.startNodes
+        self.target[envs] = self.startNodes
+        self.progress[envs] = 0
+        self.length[envs] = 0
+        self.direction[envs] = STOP
+        self.speed[envs] = 100
+        self.randomMove[envs] = False
+        self.points[envs] = 200
+        self.direction[envs, 0] = LEFT
+        self.target[envs, 0] = self.pacmanStartTarget
+        self.length[envs, 0] = self.lengths[self.startNodes[0], LEFT+2]
+        self.progress[envs, 0] = self.length[envs, 0] / 2.0
+        for k in range(len(SLOTS)):
+            self.updatePosition(envs, k)
+        self.alive[envs] = True
+        self.fruitActive[envs] = False
+
+    def step(self, actions, dt=1.0/TICKRATE):
+        actions = np.broadcast_to(np.asarray(actions, dtype=np.int8), (self.numEnvs,))
+        rows = np.flatnonzero(~self.done)
+        self.clock[rows] += dt
+        for k in GHOSTSLOTS:
+            self.updateMode(rows, k)
+            self.updateGoal(rows, k)
+            self.moveGhost(rows, k, dt)
+        self.checkPelletEvents(rows)
+        paused = self.checkGhostEvents(rows)
+        self.checkFruitEvents(rows)
+        # Eating a ghost pauses GameController before Pacman moves.
+        moving = rows[self.alive[rows] & ~np.isin(rows, paused)]
+        self.movePacman(moving, actions[moving], dt)
+
+        dead = rows[~self.alive[rows]]
+        gameover = dead[self.lives[dead] <= 0]
+        self.done[gameover] = True
+        self.resetLevel(dead[self.lives[dead] > 0])
+        return self.done
+
+    def updateMode(self, rows, k):
+        switch = rows[self.clock[rows] >= self.mainDeadline[rows, k]]
+        toChase = switch[self.mainMode[switch, k] == SCATTER]
+        toScatter = switch[self.mainMode[switch, k] == CHASE]
+        self.mainMode[toChase, k] = CHASE
+        self.mainDeadline[toChase, k] = self.clock[toChase] + CHASETIME
+        self.mainMode[toScatter, k] = SCATTER
+        self.mainDeadline[toScatter, k] = self.clock[toScatter] + SCATTERTIME
+
+        freight = rows[self.mode[rows, k] == FREIGHT]
+        ended = freight[self.clock[freight] >= self.freightDeadline[freight, k]]
+        self.normalMode(ended, k)
+        normal = rows[(self.mode[rows, k] == SCATTER) | (self.mode[rows, k] == CHASE)]
+        self.mode[ended, k] = self.mainMode[ended, k]
+        self.mode[normal, k] = self.mainMode[normal, k]
+
+        spawn = rows[self.mode[rows, k] == SPAWN]
+        home = spawn[self.node[spawn, k] == self.spawnNode]
+        self.normalMode(home, k)
+        self.mode[home, k] = self.mainMode[home, k]
+
+    def normalMode(self, rows, k):
+        self.speed[rows, k] = 100
+        self.randomMove[rows, k] = False
+        self.access[rows, self.ghostHomeNode, DOWN+2] &= ~np.uint8(1 << k)
+
+    def updateGoal(self, rows, k):
+        scatter = rows[self.mode[rows, k] == SCATTER]
+        self.goal[scatter, k] = self.scatterGoals[k]
+        chase = rows[self.mode[rows, k] == CHASE]
+        pacman = self.position[chase, 0]
+        heading = VECTORS[self.direction[chase, 0]+2]
+        if SLOTS[k] == BLINKY:
+            self.goal[chase, k] = pacman
+        elif SLOTS[k] == PINKY:
+            self.goal[chase, k] = pacman + heading * TILEWIDTH * 4
+        elif SLOTS[k] == INKY:
+            blinky = self.position[chase, 1]
+            vec2 = (pacman + heading * TILEWIDTH * 2 - blinky) * 2
+            self.goal[chase, k] = blinky + vec2
+        elif SLOTS[k] == CLYDE:
+            d = pacman - self.position[chase, k]
+            near = d[:, 0]**2 + d[:, 1]**2 <= (TILEWIDTH * 8)**2
+            goal = pacman + heading * TILEWIDTH * 4
+            goal[near] = self.scatterGoals[k]
+            self.goal[chase, k] = goal
+
+    def advance(self, rows, k, dt):
+        moving = rows[self.direction[rows, k] != STOP]
+        self.progress[moving, k] += self.speed[moving, k]*dt
+        return self.progress[rows, k] >= self.length[rows, k]
+
+    def setEdge(self, rows, k):
+        nodes = self.node[rows, k]
+        self.progress[rows, k] = 0
+        self.length[rows, k] = np.where(self.target[rows, k] != nodes,
+                                        self.lengths[nodes, self.direction[rows, k]+2], 0)
+
+    def updatePosition(self, rows, k):
+        nodePos = self.nodePositions[self.node[rows, k]]
+        delta = self.nodePositions[self.target[rows, k]] - nodePos
+        length = self.length[rows, k, None]
+        unit = np.divide(delta, length, out=np.zeros_like(delta), where=length != 0)
+        self.position[rows, k] = nodePos + unit*self.progress[rows, k, None]
+
+    def validDirection(self, rows, nodes, directions, k):
+        allowed = (self.access[rows, nodes, directions+2] >> k) & 1
+        return (directions != STOP) & (allowed == 1) & (self.neighbors[nodes, directions+2] != -1)
+
+    def getNewTarget(self, rows, nodes, directions, k):
+        valid = self.validDirection(rows, nodes, directions, k)
+        return np.where(valid, self.neighbors[nodes, directions+2], nodes)
+
+    def moveGhost(self, rows, k, dt):
+        overshot = self.advance(rows, k, dt)
+        moved = rows
+        rows = rows[overshot]
+        nodes = self.target[rows, k]
+        heading = self.direction[rows, k]
+
+        valid = np.stack([self.validDirection(rows, nodes, np.full(len(rows), d), k) & (d != -heading)
+                          for d in DIRECTIONS], axis=1)
+        nodePos = self.nodePositions[nodes]
+        distances = np.stack([((nodePos + VECTORS[d+2]*TILEWIDTH - self.goal[rows, k])**2).sum(axis=1)
+                              for d in DIRECTIONS], axis=1)
+        distances[~valid] = np.inf
+        choice = DIRECTIONS[np.argmin(distances, axis=1)]
+        counts = valid.sum(axis=1)
+        random = self.randomMove[rows, k] & (counts > 0)
+        if random.any():
+            picks = self.rng.integers(0, counts[random])
+            order = np.cumsum(valid[random], axis=1) - 1
+            choice[random] = DIRECTIONS[np.argmax(valid[random] & (order == picks[:, None]), axis=1)]
+        choice = np.where(counts > 0, choice, -heading).astype(np.int8)
+
+        portal = self.portals[nodes]
+        nodes = np.where(portal != -1, portal, nodes)
+        self.node[rows, k] = nodes
+        target = self.getNewTarget(rows, nodes, choice, k)
+        turned = target != nodes
+        self.direction[rows[turned], k] = choice[turned]
+        keep = ~turned
+        target[keep] = self.getNewTarget(rows[keep], nodes[keep], heading[keep], k)
+        self.target[rows, k] = target
+        self.setEdge(rows, k)
+        self.updatePosition(moved, k)
+
+    def movePacman(self, rows, actions, dt):
+        overshot = self.advance(rows, 0, dt)
+        moved = rows
+        reverse = rows[~overshot]
+        reverseActions = actions[~overshot]
+        reverse = reverse[(reverseActions != STOP) & (reverseActions == -self.direction[reverse, 0])]
+        self.direction[reverse, 0] *= -1
+        self.node[reverse, 0], self.target[reverse, 0] = self.target[reverse, 0], self.node[reverse, 0]
+        self.progress[reverse, 0] = self.length[reverse, 0] - self.progress[reverse, 0]
+
+        actions = actions[overshot]
+        rows = rows[overshot]
+        nodes = self.target[rows, 0]
+        portal = self.portals[nodes]
+        nodes = np.where(portal != -1, portal, nodes)
+        self.node[rows, 0] = nodes
+        target = self.getNewTarget(rows, nodes, actions, 0)
+        turned = target != nodes
+        self.direction[rows[turned], 0] = actions[turned]
+        keep = ~turned
+        target[keep] = self.getNewTarget(rows[keep], nodes[keep], self.direction[rows[keep], 0], 0)
+        self.target[rows, 0] = target
+        self.direction[rows[target == nodes], 0] = STOP
+        self.setEdge(rows, 0)
+        self.updatePosition(moved, 0)
+
+    def collide(self, rows, positions, radius):
+        d = self.position[rows, 0] - positions
+        return d[:, 0]**2 + d[:, 1]**2 <= (5 + radius)**2
+
+    def checkPelletEvents(self, rows):
+        tiles = np.rint(self.position[rows, 0] / (TILEWIDTH, TILEHEIGHT)).astype(np.int64)
+        col = np.clip(tiles[:, 0], 0, self.pelletTemplate.shape[1]-1)
+        row = np.clip(tiles[:, 1], 0, self.pelletTemplate.shape[0]-1)
+        kind = self.pellets[rows, row, col]
+        eaten = (kind != 0) & self.collide(rows, np.stack([col*TILEWIDTH, row*TILEHEIGHT], axis=1), 2 * TILEWIDTH / 16)
+        rows, row, col, kind = rows[eaten], row[eaten], col[eaten], kind[eaten]
+
+        self.numEaten[rows] += 1
+        self.score[rows] += np.where(kind == POWERPELLET, 50, 10)
+        inky = rows[self.numEaten[rows] == 30]
+        self.access[inky, self.startNodes[3], RIGHT+2] |= np.uint8(1 << 3)
+        clyde = rows[self.numEaten[rows] == 70]
+        self.access[clyde, self.startNodes[4], LEFT+2] |= np.uint8(1 << 4)
+        self.pellets[rows, row, col] = 0
+        self.startFreight(rows[kind == POWERPELLET])
+        cleared = rows[self.numEaten[rows] == self.numPellets]
+        self.levelComplete[cleared] = True
+        self.done[cleared] = True
+
+    def startFreight(self, rows):
+        for k in GHOSTSLOTS:
+            normal = rows[(self.mode[rows, k] == SCATTER) | (self.mode[rows, k] == CHASE)]
+            self.mode[normal, k] = FREIGHT
+            freight = rows[self.mode[rows, k] == FREIGHT]
+            self.freightDeadline[freight, k] = self.clock[freight] + FREIGHTTIME
+            self.speed[freight, k] = 50
+            self.randomMove[freight, k] = True
+        self.points[np.ix_(rows, GHOSTSLOTS)] = 200
+
+    def checkGhostEvents(self, rows):
+        paused = []
+        for k in GHOSTSLOTS:
+            hit = rows[self.collide(rows, self.position[rows, k], 5)]
+            eaten = hit[self.mode[hit, k] == FREIGHT]
+            self.score[eaten] += self.points[eaten, k]
+            self.points[np.ix_(eaten, GHOSTSLOTS)] *= 2
+            self.mode[eaten, k] = SPAWN
+            self.speed[eaten, k] = 150
+            self.randomMove[eaten, k] = False
+            self.goal[eaten, k] = self.nodePositions[self.spawnNode]
+            self.access[eaten, self.homeNode, DOWN+2] |= np.uint8(1 << k)
+            paused.append(eaten)
+
+            killed = hit[(self.mode[hit, k] != FREIGHT) & (self.mode[hit, k] != SPAWN) & self.alive[hit]]
+            self.lives[killed] -= 1
+            self.alive[killed] = False
+            self.direction[killed, 0] = STOP
+        return np.concatenate(paused)
+
+    def checkFruitEvents(self, rows):
+        spawn = rows[((self.numEaten[rows] == 50) | (self.numEaten[rows] == 140)) & ~self.fruitActive[rows]]
+        self.fruitActive[spawn] = True
+        self.fruitDeadline[spawn] = self.clock[spawn] + 5
+        active = rows[self.fruitActive[rows]]
+        caught = self.collide(active, self.fruitPosition, 5)
+        self.score[active[caught]] += self.fruitPoints
+        expired = active[~caught & (self.clock[active] >= self.fruitDeadline[active])]
+        self.fruitActive[active[caught]] = False
+        self.fruitActive[expired] = False
@@ -5,6 +5,11 @@ NCOLS = 28
 SCREENWIDTH = NCOLS*TILEWIDTH
 SCREENHEIGHT = NROWS*TILEHEIGHT
 SCREENSIZE = (SCREENWIDTH, SCREENHEIGHT)
+FRAMERATE = 30
+TICKRATE = 60
+MAXFRAMETIME = 0.25
+EVENTEPSILON = 0.000001
+TIMEUNITS = 3600
 
 BLACK = (0, 0, 0)
 YELLOW = (255, 255, 0)
@@ -37,6 +42,10 @@ CHASE = 1
 FREIGHT = 2
 SPAWN = 3
 
+SCATTERTIME = 7
+CHASETIME = 20
+FREIGHTTIME = 7
+
 SCORETXT = 0
 LEVELTXT = 1
 READYTXT = 2
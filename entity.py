@@ -3,10 +3,12 @@ from pygame.locals import *
 from vector import Vector2
 from constants import *
 from random import randint
+import math
 
 class Entity(object):
-    def __init__(self, node):
+    def __init__(self, node, scale=1):
         self.name = None
+        self.scale = scale
         self.directions = {UP:Vector2(0, -1),DOWN:Vector2(0, 1), 
                           LEFT:Vector2(-1, 0), RIGHT:Vector2(1, 0), STOP:Vector2()}
         self.direction = STOP
@@ -19,13 +21,43 @@ class Entity(object):
         self.goal = None
         self.directionMethod = self.randomDirection
         self.setStartNode(node)
+        self.setPrevious()
         self.image = None
 
+    @property
+    def position(self):
+        return self.getPosition(self.node, self.target, self.progress, self.length)
+
+    @property
+    def previousPosition(self):
+        return self.getPosition(self.previousNode, self.previousTarget, self.previousProgress, self.previousLength)
+
+    def getPosition(self, node, target, progress, length):
+        if length == 0:
+            return node.position.copy()
+        return node.position + (target.position - node.position) / length * progress
+
+    def setPrevious(self):
+        self.previousNode = self.node
+        self.previousTarget = self.target
+        self.previousProgress = self.progress
+        self.previousLength = self.length
+
     def setPosition(self):
-        self.position = self.node.position.copy()
+        self.progress = 0
+        self.length = 0
+        if self.target is not self.node:
+            self.length = self.getLength(self.direction)
+
+    def getLength(self, direction):
+        if self.scale == 1:
+            return self.node.lengths[direction]
+        return int(round(self.node.lengths[direction] * self.scale))
 
     def update(self, dt):
-        self.position += self.directions[self.direction]*self.speed*dt
+        self.setPrevious()
+        if self.direction is not STOP:
+            self.progress += self.speed*dt
          
         if self.overshotTarget():
             self.node = self.target
@@ -44,7 +76,7 @@ class Entity(object):
           
     def validDirection(self, direction):
         if direction is not STOP:
-            if self.name in self.node.access[direction]:
+            if (self.node.access[direction] >> self.name) & 1:
                 if self.node.neighbors[direction] is not None:
                     return True
         return False
@@ -56,19 +88,46 @@ class Entity(object):
 
     def overshotTarget(self):
         if self.target is not None:
-            vec1 = self.target.position - self.node.position
-            vec2 = self.position - self.node.position
-            node2Target = vec1.magnitudeSquared()
-            node2Self = vec2.magnitudeSquared()
-            return node2Self >= node2Target
+            return self.progress >= self.length
+        return False
+
+    def getVelocity(self):
+        return self.directions[self.direction]*self.speed
+
+    def canMove(self):
+        for direction in [UP, DOWN, LEFT, RIGHT]:
+            if self.validDirection(direction):
+                return True
         return False
 
+    def timeToTarget(self):
+        if self.target is self.node:
+            if self.canMove():
+                return 0
+            return None
+        if self.direction is STOP:
+            return None
+        return max(self.length - self.progress, 0) / (self.speed * self.scale)
+
+    def timeToCollide(self, other, velocity=None):
+        d = self.position - other.position
+        v = self.getVelocity()
+        if velocity is not None:
+            v = v - velocity
+        c = d.magnitudeSquared() - (self.collideRadius + other.collideRadius)**2
+        a = v.magnitudeSquared()
+        b = d.dot(v)
+        if c <= 0 or a == 0 or b >= 0 or b*b < a*c:
+            return None
+        return (-b - math.sqrt(b*b - a*c)) / a
+
     def reverseDirection(self):
         self.direction *= -1
         temp = self.node
         self.node = self.target
         self.target = temp
-        
+        self.progress = self.length - self.progress
+
     def oppositeDirection(self, direction):
         if direction is not STOP:
             if direction == self.direction * -1:
@@ -76,14 +135,7 @@ class Entity(object):
         return False
 
     def validDirections(self):
-        directions = []
-        for key in [UP, DOWN, LEFT, RIGHT]:
-            if self.validDirection(key):
-                if key != self.direction * -1:
-                    directions.append(key)
-        if len(directions) == 0:
-            directions.append(self.direction * -1)
-        return directions
+        return self.node.getExits(self.name, self.direction)
 
     def randomDirection(self, directions):
         return directions[randint(0, len(directions)-1)]
@@ -105,7 +157,21 @@ class Entity(object):
     def setBetweenNodes(self, direction):
         if self.node.neighbors[direction] is not None:
             self.target = self.node.neighbors[direction]
-            self.position = (self.node.position + self.target.position) / 2.0
+            self.length = self.getLength(direction)
+            if self.scale == 1:
+                self.progress = self.length / 2.0
+            else:
+                self.progress = self.length // 2
+
+    def getState(self, nodes):
+        return (self.progress, self.length, nodes.getNodeId(self.node), nodes.getNodeId(self.target),
+                self.direction, self.speed, self.visible)
+
+    def setState(self, state, nodes):
+        self.progress, self.length, node, target, self.direction, self.speed, self.visible = state
+        self.node = nodes.getNodeFromId(node)
+        self.target = nodes.getNodeFromId(target)
+        self.setPrevious()
 
     def reset(self):
         self.setStartNode(self.startNode)
@@ -115,13 +181,32 @@ class Entity(object):
 
     def setSpeed(self, speed):
         self.speed = speed * TILEWIDTH / 16
+        if self.scale != 1:
+            self.speed = int(round(self.speed))
+
+    def interpolatedPosition(self, alpha):
+        d = self.position - self.previousPosition
+        if d.magnitudeSquared() > TILEWIDTH**2:
+            return self.position
+        return self.previousPosition + d*alpha
+
+    def getRect(self, alpha=1.0):
+        position = self.interpolatedPosition(alpha)
+        if self.image is not None:
+            rect = pygame.Rect((0, 0), self.image.get_size())
+            rect.topleft = (int(position.x - TILEWIDTH / 2), int(position.y - TILEHEIGHT / 2))
+        else:
+            rect = pygame.Rect(0, 0, 2*self.radius, 2*self.radius)
+            rect.center = position.asInt()
+        return rect.inflate(2, 2)
 
-    def render(self, screen):
+    def render(self, screen, alpha=1.0):
         if self.visible:
+            position = self.interpolatedPosition(alpha)
             if self.image is not None:
                 adjust = Vector2(TILEWIDTH, TILEHEIGHT) / 2
-                p = self.position - adjust
+                p = position - adjust
                 screen.blit(self.image, p.asTuple())
             else:
-                p = self.position.asInt()
+                p = position.asInt()
                 pygame.draw.circle(screen, self.color, p, self.radius)
\ No newline at end of file
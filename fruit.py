@@ -4,18 +4,25 @@ from constants import *
 from sprites import FruitSprites
 
 class Fruit(Entity):
-    def __init__(self, node, level=0):
-        Entity.__init__(self, node)
+    def __init__(self, node, timers, level=0):
+        Entity.__init__(self, node, timers.scale)
         self.name = FRUIT
         self.color = GREEN
         self.lifespan = 5
-        self.timer = 0
+        self.timers = timers
+        self.timer = None
+        self.setTimer(timers.timeAfter(self.lifespan))
         self.destroy = False
         self.points = 100 + level*20
         self.setBetweenNodes(RIGHT)
         self.sprites = FruitSprites(self, level)
 
-    def update(self, dt):
-        self.timer += dt
-        if self.timer >= self.lifespan:
-            self.destroy = True
\ No newline at end of file
+    def expire(self):
+        self.timer = None
+        self.destroy = True
+
+    def setTimer(self, deadline):
+        self.timers.cancel(self.timer)
+        self.timer = None
+        if deadline is not None:
+            self.timer = self.timers.scheduleAt(deadline, self.expire)
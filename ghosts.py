@@ -7,14 +7,14 @@ from modes import ModeController
 from sprites import GhostSprites
 
 class Ghost(Entity):
-    def __init__(self, node, pacman=None, blinky=None):
-        Entity.__init__(self, node)
+    def __init__(self, node, timers, pacman=None, blinky=None):
+        Entity.__init__(self, node, timers.scale)
         self.name = GHOST
         self.points = 200
         self.goal = Vector2()
         self.directionMethod = self.goalDirection
         self.pacman = pacman
-        self.mode = ModeController(self)
+        self.mode = ModeController(self, timers)
         self.blinky = blinky
         self.homeNode = node
 
@@ -23,8 +23,22 @@ class Ghost(Entity):
         self.points = 200
         self.directionMethod = self.goalDirection
 
+    def getState(self, nodes):
+        return Entity.getState(self, nodes) + (self.points, self.goal.x, self.goal.y,
+                                               self.directionMethod == self.randomDirection, self.mode.getState())
+
+    def setState(self, state, nodes):
+        Entity.setState(self, state[:-5], nodes)
+        self.points, x, y, random, mode = state[-5:]
+        self.goal = Vector2(x, y)
+        if random:
+            self.directionMethod = self.randomDirection
+        else:
+            self.directionMethod = self.goalDirection
+        self.mode.setState(mode)
+
     def update(self, dt):
-        self.sprites.update(dt)
+        self.sprites.update(dt / self.scale)
         self.mode.update(dt)
         if self.mode.current is SCATTER:
             self.scatter()
@@ -66,16 +80,16 @@ class Ghost(Entity):
 
 
 class Blinky(Ghost):
-    def __init__(self, node, pacman=None, blinky=None):
-        Ghost.__init__(self, node, pacman, blinky)
+    def __init__(self, node, timers, pacman=None, blinky=None):
+        Ghost.__init__(self, node, timers, pacman, blinky)
         self.name = BLINKY
         self.color = RED
         self.sprites = GhostSprites(self)
 
 
 class Pinky(Ghost):
-    def __init__(self, node, pacman=None, blinky=None):
-        Ghost.__init__(self, node, pacman, blinky)
+    def __init__(self, node, timers, pacman=None, blinky=None):
+        Ghost.__init__(self, node, timers, pacman, blinky)
         self.name = PINKY
         self.color = PINK
         self.sprites = GhostSprites(self)
@@ -88,8 +102,8 @@ class Pinky(Ghost):
 
 
 class Inky(Ghost):
-    def __init__(self, node, pacman=None, blinky=None):
-        Ghost.__init__(self, node, pacman, blinky)
+    def __init__(self, node, timers, pacman=None, blinky=None):
+        Ghost.__init__(self, node, timers, pacman, blinky)
         self.name = INKY
         self.color = TEAL
         self.sprites = GhostSprites(self)
@@ -104,8 +118,8 @@ class Inky(Ghost):
 
 
 class Clyde(Ghost):
-    def __init__(self, node, pacman=None, blinky=None):
-        Ghost.__init__(self, node, pacman, blinky)
+    def __init__(self, node, timers, pacman=None, blinky=None):
+        Ghost.__init__(self, node, timers, pacman, blinky)
         self.name = CLYDE
         self.color = ORANGE
         self.sprites = GhostSprites(self)
@@ -123,11 +137,11 @@ class Clyde(Ghost):
 
 
 class GhostGroup(object):
-    def __init__(self, node, pacman):
-        self.blinky = Blinky(node, pacman)
-        self.pinky = Pinky(node, pacman)
-        self.inky = Inky(node, pacman, self.blinky)
-        self.clyde = Clyde(node, pacman)
+    def __init__(self, node, pacman, timers):
+        self.blinky = Blinky(node, timers, pacman)
+        self.pinky = Pinky(node, timers, pacman)
+        self.inky = Inky(node, timers, pacman, self.blinky)
+        self.clyde = Clyde(node, timers, pacman)
         self.ghosts = [self.blinky, self.pinky, self.inky, self.clyde]
 
     def __iter__(self):
@@ -166,7 +180,7 @@ class GhostGroup(object):
         for ghost in self:
             ghost.reset()
 
-    def render(self, screen):
+    def render(self, screen, alpha=1.0):
         for ghost in self:
-            ghost.render(screen)
+            ghost.render(screen, alpha)
 
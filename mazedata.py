@@ -1,4 +1,5 @@
 from constants import *
+from nodes import getAccessMask
 
 class MazeBase(object):
     def __init__(self):
@@ -19,12 +20,13 @@ class MazeBase(object):
         return x+self.homeoffset[0], y+self.homeoffset[1]
 
     def denyGhostsAccess(self, ghosts, nodes):
-        nodes.denyAccessList(*(self.addOffset(2, 3) + (LEFT, ghosts)))
-        nodes.denyAccessList(*(self.addOffset(2, 3) + (RIGHT, ghosts)))
+        mask = getAccessMask(ghosts)
+        nodes.denyAccessMask(*(self.addOffset(2, 3) + (LEFT, mask)))
+        nodes.denyAccessMask(*(self.addOffset(2, 3) + (RIGHT, mask)))
 
         for direction in list(self.ghostNodeDeny.keys()):
             for values in self.ghostNodeDeny[direction]:
-                nodes.denyAccessList(*(values + (direction, ghosts)))
+                nodes.denyAccessMask(*(values + (direction, mask)))
 
 
 class Maze1(MazeBase):
@@ -0,0 +1,88 @@
+import os
+import hashlib
+import numpy as np
+
+CACHEDIR = ".mazecache"
+
+class MazeRepository(object):
+    def __init__(self, cachedir=CACHEDIR):
+        self.cachedir = cachedir
+        self.cache = {}
+        self.digests = {}
+
+    def get(self, kind, name, build):
+        key = (kind, name)
+        if key not in self.cache:
+            self.cache[key] = build(name)
+        return self.cache[key]
+
+    def getCompiled(self, kind, textfile, build):
+        return self.get(kind, textfile, lambda name: self.loadCompiled(kind, name, build))
+
+    def loadCompiled(self, kind, textfile, build):
+        if self.cachedir is None:
+            return self.freeze(build(textfile))
+        path = self.getCachePath(textfile, kind+".npy")
+        if self.isCurrent(path, [textfile]):
+            return np.load(path, mmap_mode='r')
+        array = self.freeze(build(textfile))
+        self.writeFile(path, lambda f: np.save(f, array))
+        self.writeSignature(path, [textfile])
+        return array
+
+    def freeze(self, array):
+        array = np.ascontiguousarray(array)
+        array.setflags(write=False)
+        return array
+
+    def getGrid(self, textfile):
+        return self.get("grid", textfile, self.decodeGrid)
+
+    def getTiles(self, textfile):
+        return self.getCompiled("tiles", textfile, self.parseTiles)
+
+    def parseTiles(self, textfile):
+        return np.loadtxt(textfile, dtype='<U1').astype('S1').view(np.uint8)
+
+    def decodeGrid(self, textfile):
+        grid = self.getTiles(textfile).view('S1').astype('<U1')
+        grid.setflags(write=False)
+        return grid
+
+    def getCachePath(self, textfile, suffix):
+        name = os.path.splitext(os.path.basename(textfile))[0]
+        return os.path.join(self.cachedir, name+"."+suffix)
+
+    def getDigest(self, textfile):
+        if textfile not in self.digests:
+            with open(textfile, 'rb') as f:
+                self.digests[textfile] = hashlib.sha1(f.read()).hexdigest()
+        return self.digests[textfile]
+
+    def getSignature(self, sources):
+        return " ".join([self.getDigest(textfile) for textfile in sources])
+
+    def isCurrent(self, path, sources):
+        sigpath = path + ".sig"
+        if not os.path.exists(path) or not os.path.exists(sigpath):
+            return False
+        with open(sigpath) as f:
+            return f.read() == self.getSignature(sources)
+
+    def writeSignature(self, path, sources):
+        signature = self.getSignature(sources)
+        self.writeFile(path + ".sig", lambda f: f.write(signature.encode()))
+
+    def writeFile(self, path, write):
+        os.makedirs(self.cachedir, exist_ok=True)
+        temppath = "%s.%d.tmp" % (path, os.getpid())
+        with open(temppath, 'wb') as f:
+            write(f)
+        os.replace(temppath, path)
+
+    def clear(self):
+        self.cache = {}
+        self.digests = {}
+
+
+mazes = MazeRepository()
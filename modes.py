@@ -1,61 +1,89 @@
 from constants import *
 
 class MainMode(object):
-    def __init__(self):
-        self.timer = 0
+    def __init__(self, timers):
+        self.timers = timers
+        self.timer = None
         self.scatter()
 
-    def update(self, dt):
-        self.timer += dt
-        if self.timer >= self.time:
-            if self.mode is SCATTER:
-                self.chase()
-            elif self.mode is CHASE:
-                self.scatter()
+    def switch(self):
+        self.timer = None
+        if self.mode is SCATTER:
+            self.chase()
+        elif self.mode is CHASE:
+            self.scatter()
+
+    def getState(self):
+        return (self.mode, self.time, self.timers.getDeadline(self.timer))
+
+    def setState(self, state):
+        self.mode, self.time, deadline = state
+        self.setTimer(deadline)
+
+    def setTimer(self, deadline):
+        self.timers.cancel(self.timer)
+        self.timer = None
+        if deadline is not None:
+            self.timer = self.timers.scheduleAt(deadline, self.switch)
 
     def scatter(self):
         self.mode = SCATTER
-        self.time = 7
-        self.timer = 0
+        self.time = SCATTERTIME
+        self.setTimer(self.timers.timeAfter(self.time))
 
     def chase(self):
         self.mode = CHASE
-        self.time = 20
-        self.timer = 0
+        self.time = CHASETIME
+        self.setTimer(self.timers.timeAfter(self.time))
 
 
 class ModeController(object):
-    def __init__(self, entity):
-        self.timer = 0
+    def __init__(self, entity, timers):
+        self.timers = timers
+        self.timer = None
         self.time = None
-        self.mainmode = MainMode()
+        self.mainmode = MainMode(timers)
         self.current = self.mainmode.mode
         self.entity = entity 
 
     def update(self, dt):
-        self.mainmode.update(dt)
-        if self.current is FREIGHT:
-            self.timer += dt
-            if self.timer >= self.time:
-                self.time = None
-                self.entity.normalMode()
-                self.current = self.mainmode.mode
-        elif self.current in [SCATTER, CHASE]:
+        if self.current in [SCATTER, CHASE]:
             self.current = self.mainmode.mode
 
         if self.current is SPAWN:
-            if self.entity.node == self.entity.spawnNode:
+            if self.entity.node is self.entity.spawnNode:
                 self.entity.normalMode()
                 self.current = self.mainmode.mode
 
+    def endFreight(self):
+        self.timer = None
+        self.time = None
+        self.entity.normalMode()
+        self.current = self.mainmode.mode
+
+    def getState(self):
+        return (self.current, self.time, self.timers.getDeadline(self.timer), self.mainmode.getState())
+
+    def setState(self, state):
+        self.current, self.time, deadline, mainmode = state
+        self.setTimer(deadline)
+        self.mainmode.setState(mainmode)
+
+    def setTimer(self, deadline):
+        self.timers.cancel(self.timer)
+        self.timer = None
+        if deadline is not None:
+            self.timer = self.timers.scheduleAt(deadline, self.endFreight)
+
     def setFreightMode(self):
         if self.current in [SCATTER, CHASE]:
-            self.timer = 0
-            self.time = 7
+            self.time = FREIGHTTIME
+            self.setTimer(self.timers.timeAfter(self.time))
             self.current = FREIGHT
         elif self.current is FREIGHT:
-            self.timer = 0
+            self.setTimer(self.timers.timeAfter(self.time))
 
     def setSpawnMode(self):
         if self.current is FREIGHT:
-            self.current = SPAWN
\ No newline at end of file
+            self.setTimer(None)
+            self.current = SPAWN
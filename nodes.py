@@ -1,24 +1,63 @@
 import pygame
+import hashlib
 from vector import Vector2
 from constants import *
 import numpy as np
+from mazerepo import mazes
+
+ACCESSDIRECTIONS = (UP, DOWN, LEFT, RIGHT)
+GRAPHDIRECTIONS = ACCESSDIRECTIONS + (PORTAL,)
+GRAPHCOLUMNS = {direction:i for i, direction in enumerate(GRAPHDIRECTIONS)}
+ALLACCESS = (1 << PACMAN) | (1 << BLINKY) | (1 << PINKY) | (1 << INKY) | (1 << CLYDE) | (1 << FRUIT)
+
+def getAccessMask(entities):
+    mask = 0
+    for entity in entities:
+        mask |= 1 << entity.name
+    return mask
 
 class Node(object):
     def __init__(self, x, y):
+        self.id = None
         self.position = Vector2(x, y)
         self.neighbors = {UP:None, DOWN:None, LEFT:None, RIGHT:None, PORTAL:None}
-        self.access = {UP:[PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT], 
-                       DOWN:[PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT], 
-                       LEFT:[PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT], 
-                       RIGHT:[PACMAN, BLINKY, PINKY, INKY, CLYDE, FRUIT]}
+        self.lengths = {UP:0, DOWN:0, LEFT:0, RIGHT:0}
+        self.access = {UP:ALLACCESS, DOWN:ALLACCESS, LEFT:ALLACCESS, RIGHT:ALLACCESS}
+        self.version = 0
+        self.exits = {}
+
+    def setAccess(self, direction, mask):
+        if self.access[direction] != mask:
+            self.access[direction] = mask
+            self.version += 1
 
     def denyAccess(self, direction, entity):
-        if entity.name in self.access[direction]:
-            self.access[direction].remove(entity.name)
+        self.setAccess(direction, self.access[direction] & ~(1 << entity.name))
 
     def allowAccess(self, direction, entity):
-        if entity.name not in self.access[direction]:
-            self.access[direction].append(entity.name)
+        self.setAccess(direction, self.access[direction] | (1 << entity.name))
+
+    def denyAccessMask(self, direction, mask):
+        self.setAccess(direction, self.access[direction] & ~mask)
+
+    def allowAccessMask(self, direction, mask):
+        self.setAccess(direction, self.access[direction] | mask)
+
+    def getExits(self, name, heading):
+        key = (name, heading)
+        entry = self.exits.get(key)
+        if entry is None or entry[0] != self.version:
+            entry = (self.version, self.findExits(name, heading))
+            self.exits[key] = entry
+        return entry[1]
+
+    def findExits(self, name, heading):
+        exits = tuple(direction for direction in ACCESSDIRECTIONS
+                      if direction != heading * -1 and self.neighbors[direction] is not None
+                      and (self.access[direction] >> name) & 1)
+        if len(exits) == 0:
+            return (heading * -1,)
+        return exits
 
     def render(self, screen):
         for n in self.neighbors.keys():
@@ -29,20 +68,99 @@ class Node(object):
                 pygame.draw.circle(screen, RED, self.position.asInt(), 12)
 
 
+class NodeGraph(object):
+    def __init__(self, nodes):
+        self.nodes = nodes
+        self.positions = np.array([node.position.asTuple() for node in nodes], dtype=float).reshape(-1, 2)
+        self.neighbors = np.full((len(nodes), len(GRAPHDIRECTIONS)), -1, dtype=np.int32)
+        self.lengths = np.zeros((len(nodes), len(GRAPHDIRECTIONS)))
+        for node in nodes:
+            for direction, column in GRAPHCOLUMNS.items():
+                if node.neighbors[direction] is not None:
+                    self.neighbors[node.id, column] = node.neighbors[direction].id
+            for direction, length in node.lengths.items():
+                self.lengths[node.id, GRAPHCOLUMNS[direction]] = length
+        self.positions.setflags(write=False)
+        self.neighbors.setflags(write=False)
+        self.lengths.setflags(write=False)
+        self.paths = None
+        self.distances = None
+        self.nextHops = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def getNeighbors(self, direction):
+        return self.neighbors[:, GRAPHCOLUMNS[direction]]
+
+    def getLengths(self, direction):
+        return self.lengths[:, GRAPHCOLUMNS[direction]]
+
+    def getKey(self):
+        return hashlib.sha1(self.neighbors.tobytes() + self.lengths.tobytes()).hexdigest()[:12]
+
+    def solvePaths(self):
+        if self.paths is None:
+            ids = np.arange(len(self.nodes))
+            distances = np.full((len(ids), len(ids)), np.inf)
+            nextHops = np.full((len(ids), len(ids)), -1, dtype=np.int32)
+            distances[ids, ids] = 0
+            nextHops[ids, ids] = ids
+            for column in range(len(GRAPHDIRECTIONS)):
+                linked = self.neighbors[:, column] != -1
+                src, dst = ids[linked], self.neighbors[linked, column]
+                shorter = self.lengths[linked, column] < distances[src, dst]
+                distances[src[shorter], dst[shorter]] = self.lengths[linked, column][shorter]
+                nextHops[src[shorter], dst[shorter]] = dst[shorter]
+            for k in ids:
+                via = distances[:, k, None] + distances[None, k, :]
+                shorter = via < distances
+                distances = np.where(shorter, via, distances)
+                nextHops = np.where(shorter, nextHops[:, k, None], nextHops)
+            self.paths = (distances, nextHops)
+        return self.paths
+
+
 class NodeGroup(object):
     def __init__(self, level):
         self.level = level
         self.nodesLUT = {}
         self.nodeSymbols = ['+', 'P', 'n']
         self.pathSymbols = ['.', '-', '|', 'p']
-        data = self.readMazeFile(level)
+        self.nodeList = []
+        self.graph = None
+        self.createFromTemplate(mazes.getCompiled("nodetiles", level, self.buildTemplate))
+        self.homekey = None
+
+    def readMazeFile(self, textfile):
+        return mazes.getGrid(textfile)
+
+    def buildTemplate(self, textfile):
+        data = self.readMazeFile(textfile)
         self.createNodeTable(data)
         self.connectHorizontally(data)
         self.connectVertically(data)
-        self.homekey = None
+        self.indexNodes()
+        table = np.full((len(self.nodeList), 2+len(ACCESSDIRECTIONS)), -1, dtype=np.int32)
+        for i, node in enumerate(self.nodeList):
+            table[i, :2] = (node.position.x // TILEWIDTH, node.position.y // TILEHEIGHT)
+            for j, direction in enumerate(ACCESSDIRECTIONS):
+                if node.neighbors[direction] is not None:
+                    table[i, 2+j] = node.neighbors[direction].id
+        self.nodesLUT = {}
+        self.indexNodes()
+        return table
 
-    def readMazeFile(self, textfile):
-        return np.loadtxt(textfile, dtype='<U1')
+    def createFromTemplate(self, table):
+        rows = table.tolist()
+        keys = [self.constructKey(row[0], row[1]) for row in rows]
+        nodes = [Node(x, y) for x, y in keys]
+        for node, key, row in zip(nodes, keys, rows):
+            self.nodesLUT[key] = node
+            for direction, other in zip(ACCESSDIRECTIONS, row[2:]):
+                if other != -1:
+                    node.neighbors[direction] = nodes[other]
+                    node.lengths[direction] = (nodes[other].position - node.position).magnitude()
 
     def createNodeTable(self, data, xoffset=0, yoffset=0):
         for row in list(range(data.shape[0])):
@@ -50,6 +168,7 @@ class NodeGroup(object):
                 if data[row][col] in self.nodeSymbols:
                     x, y = self.constructKey(col+xoffset, row+yoffset)
                     self.nodesLUT[(x, y)] = Node(x, y)
+                    self.graph = None
 
     def constructKey(self, x, y):
         return x * TILEWIDTH, y * TILEHEIGHT
@@ -64,8 +183,7 @@ class NodeGroup(object):
                         key = self.constructKey(col+xoffset, row+yoffset)
                     else:
                         otherkey = self.constructKey(col+xoffset, row+yoffset)
-                        self.nodesLUT[key].neighbors[RIGHT] = self.nodesLUT[otherkey]
-                        self.nodesLUT[otherkey].neighbors[LEFT] = self.nodesLUT[key]
+                        self.connectNodes(self.nodesLUT[key], self.nodesLUT[otherkey], RIGHT)
                         key = otherkey
                 elif data[row][col] not in self.pathSymbols:
                     key = None
@@ -80,13 +198,72 @@ class NodeGroup(object):
                         key = self.constructKey(col+xoffset, row+yoffset)
                     else:
                         otherkey = self.constructKey(col+xoffset, row+yoffset)
-                        self.nodesLUT[key].neighbors[DOWN] = self.nodesLUT[otherkey]
-                        self.nodesLUT[otherkey].neighbors[UP] = self.nodesLUT[key]
+                        self.connectNodes(self.nodesLUT[key], self.nodesLUT[otherkey], DOWN)
                         key = otherkey
                 elif dataT[col][row] not in self.pathSymbols:
                     key = None
 
 
+    def connectNodes(self, node, other, direction):
+        length = (other.position - node.position).magnitude()
+        node.neighbors[direction] = other
+        node.lengths[direction] = length
+        node.version += 1
+        other.neighbors[direction*-1] = node
+        other.lengths[direction*-1] = length
+        other.version += 1
+        self.graph = None
+
+    def indexNodes(self):
+        if len(self.nodeList) != len(self.nodesLUT):
+            self.nodeList = list(self.nodesLUT.values())
+            for i, node in enumerate(self.nodeList):
+                node.id = i
+            self.graph = None
+
+    def getGraph(self):
+        self.indexNodes()
+        if self.graph is None:
+            self.graph = NodeGraph(self.nodeList)
+        return self.graph
+
+    def getNodeId(self, node):
+        self.indexNodes()
+        return node.id
+
+    def getNodeFromId(self, nodeid):
+        self.indexNodes()
+        return self.nodeList[nodeid]
+
+    def getPathTables(self):
+        graph = self.getGraph()
+        if graph.distances is None:
+            key = graph.getKey()
+            graph.distances = mazes.getCompiled("distances-"+key, self.level, lambda textfile: graph.solvePaths()[0])
+            graph.nextHops = mazes.getCompiled("nexthops-"+key, self.level, lambda textfile: graph.solvePaths()[1])
+        return graph.distances, graph.nextHops
+
+    def distance(self, node, other):
+        return float(self.getPathTables()[0][node.id, other.id])
+
+    def nextHop(self, node, other):
+        hop = self.getPathTables()[1][node.id, other.id]
+        if hop == -1:
+            return None
+        return self.nodeList[hop]
+
+    def getAccessState(self):
+        self.indexNodes()
+        return tuple(node.access[direction] for node in self.nodeList for direction in ACCESSDIRECTIONS)
+
+    def setAccessState(self, state):
+        self.indexNodes()
+        for i, mask in enumerate(state):
+            self.nodeList[i // len(ACCESSDIRECTIONS)].setAccess(ACCESSDIRECTIONS[i % len(ACCESSDIRECTIONS)], mask)
+
+    def getAccessTable(self):
+        return np.array(self.getAccessState(), dtype=np.int64).reshape(-1, len(ACCESSDIRECTIONS))
+
     def getStartTempNode(self):
         nodes = list(self.nodesLUT.values())
         return nodes[0]
@@ -97,6 +274,7 @@ class NodeGroup(object):
         if key1 in self.nodesLUT.keys() and key2 in self.nodesLUT.keys():
             self.nodesLUT[key1].neighbors[PORTAL] = self.nodesLUT[key2]
             self.nodesLUT[key2].neighbors[PORTAL] = self.nodesLUT[key1]
+            self.graph = None
 
     def createHomeNodes(self, xoffset, yoffset):
         homedata = np.array([['X','X','+','X','X'],
@@ -113,8 +291,7 @@ class NodeGroup(object):
 
     def connectHomeNodes(self, homekey, otherkey, direction):     
         key = self.constructKey(*otherkey)
-        self.nodesLUT[homekey].neighbors[direction] = self.nodesLUT[key]
-        self.nodesLUT[key].neighbors[direction*-1] = self.nodesLUT[homekey]
+        self.connectNodes(self.nodesLUT[homekey], self.nodesLUT[key], direction)
 
     def getNodeFromPixels(self, xpixel, ypixel):
         if (xpixel, ypixel) in self.nodesLUT.keys():
@@ -137,13 +314,21 @@ class NodeGroup(object):
         if node is not None:
             node.allowAccess(direction, entity)
 
+    def denyAccessMask(self, col, row, direction, mask):
+        node = self.getNodeFromTiles(col, row)
+        if node is not None:
+            node.denyAccessMask(direction, mask)
+
+    def allowAccessMask(self, col, row, direction, mask):
+        node = self.getNodeFromTiles(col, row)
+        if node is not None:
+            node.allowAccessMask(direction, mask)
+
     def denyAccessList(self, col, row, direction, entities):
-        for entity in entities:
-            self.denyAccess(col, row, direction, entity)
+        self.denyAccessMask(col, row, direction, getAccessMask(entities))
 
     def allowAccessList(self, col, row, direction, entities):
-        for entity in entities:
-            self.allowAccess(col, row, direction, entity)
+        self.allowAccessMask(col, row, direction, getAccessMask(entities))
 
     def denyHomeAccess(self, entity):
         self.nodesLUT[self.homekey].denyAccess(DOWN, entity)
@@ -152,12 +337,10 @@ class NodeGroup(object):
         self.nodesLUT[self.homekey].allowAccess(DOWN, entity)
 
     def denyHomeAccessList(self, entities):
-        for entity in entities:
-            self.denyHomeAccess(entity)
+        self.nodesLUT[self.homekey].denyAccessMask(DOWN, getAccessMask(entities))
 
     def allowHomeAccessList(self, entities):
-        for entity in entities:
-            self.allowHomeAccess(entity)
+        self.nodesLUT[self.homekey].allowAccessMask(DOWN, getAccessMask(entities))
 
     def render(self, screen):
         for node in self.nodesLUT.values():
@@ -6,13 +6,14 @@ from entity import Entity
 from sprites import PacmanSprites
 
 class Pacman(Entity):
-    def __init__(self, node):
-        Entity.__init__(self, node )
+    def __init__(self, node, scale=1):
+        Entity.__init__(self, node, scale)
         self.name = PACMAN    
         self.color = YELLOW
         self.direction = LEFT
         self.setBetweenNodes(LEFT)
         self.alive = True
+        self.learntDirection = None
         self.sprites = PacmanSprites(self)
 
     def reset(self):
@@ -23,14 +24,23 @@ class Pacman(Entity):
         self.image = self.sprites.getStartImage()
         self.sprites.reset()
 
+    def getState(self, nodes):
+        return Entity.getState(self, nodes) + (self.alive,)
+
+    def setState(self, state, nodes):
+        Entity.setState(self, state[:-1], nodes)
+        self.alive = state[-1]
+
     def die(self):
         self.alive = False
         self.direction = STOP
 
     def update(self, dt):	
-        self.sprites.update(dt)
-        self.position += self.directions[self.direction]*self.speed*dt
-        direction = self.getValidKey()
+        self.sprites.update(dt / self.scale)
+        self.setPrevious()
+        if self.direction is not STOP:
+            self.progress += self.speed*dt
+        direction = self.getDirection()
         if self.overshotTarget():
             self.node = self.target
             if self.node.neighbors[PORTAL] is not None:
@@ -48,6 +58,21 @@ class Pacman(Entity):
             if self.oppositeDirection(direction):
                 self.reverseDirection()
 
+    def canMove(self):
+        return self.validDirection(self.getDirection())
+
+    def timeToTarget(self):
+        if not self.alive:
+            return None
+        if self.oppositeDirection(self.getDirection()):
+            return 0
+        return Entity.timeToTarget(self)
+
+    def getDirection(self):
+        if self.learntDirection is not None:
+            return self.learntDirection
+        return self.getValidKey()
+
     def getValidKey(self):
         key_pressed = pygame.key.get_pressed()
         if key_pressed[K_UP]:
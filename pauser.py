@@ -1,25 +1,39 @@
 class Pause(object):
-    def __init__(self, paused=False):
+    def __init__(self, timers, paused=False):
+        self.timers = timers
         self.paused = paused
-        self.timer = 0
+        self.timer = None
         self.pauseTime = None
         self.func = None
-        
-    def update(self, dt):
-        if self.pauseTime is not None:
-            self.timer += dt
-            if self.timer >= self.pauseTime:
-                self.timer = 0
-                self.paused = False
-                self.pauseTime = None
-                return self.func
-        return None
+
+    def expire(self):
+        self.timer = None
+        self.paused = False
+        self.pauseTime = None
+        if self.func is not None:
+            self.func()
+
+    def getState(self):
+        return (self.paused, self.timers.getDeadline(self.timer), self.pauseTime, self.func)
+
+    def setState(self, state):
+        self.paused, deadline, self.pauseTime, self.func = state
+        self.setTimer(deadline)
+
+    def setTimer(self, deadline):
+        self.timers.cancel(self.timer)
+        self.timer = None
+        if deadline is not None:
+            self.timer = self.timers.scheduleAt(deadline, self.expire)
 
     def setPause(self, playerPaused=False, pauseTime=None, func=None):
-        self.timer = 0
         self.func = func
         self.pauseTime = pauseTime
+        if pauseTime is not None:
+            self.setTimer(self.timers.timeAfter(pauseTime))
+        else:
+            self.setTimer(None)
         self.flip()
 
     def flip(self):
-        self.paused = not self.paused
\ No newline at end of file
+        self.paused = not self.paused
@@ -2,11 +2,16 @@ import pygame
 from vector import Vector2
 from constants import *
 import numpy as np
+import math
+from mazerepo import mazes
 
 class Pellet(object):
     def __init__(self, row, column):
         self.name = PELLET
+        self.row = row
+        self.column = column
         self.position = Vector2(column*TILEWIDTH, row*TILEHEIGHT)
+        self.center = (self.position + Vector2(TILEWIDTH, TILEHEIGHT) / 2).asInt()
         self.color = WHITE
         self.radius = int(2 * TILEWIDTH / 16)
         self.collideRadius = 2 * TILEWIDTH / 16
@@ -15,9 +20,15 @@ class Pellet(object):
         
     def render(self, screen):
         if self.visible:
-            adjust = Vector2(TILEWIDTH, TILEHEIGHT) / 2
-            p = self.position + adjust
-            pygame.draw.circle(screen, self.color, p.asInt(), self.radius)
+            pygame.draw.circle(screen, self.color, self.center, self.radius)
+
+    def getRect(self):
+        rect = pygame.Rect(0, 0, 2*self.radius+2, 2*self.radius+2)
+        rect.center = self.center
+        return rect
+
+    def erase(self, screen):
+        pygame.draw.circle(screen, BLACK, self.center, self.radius)
 
 
 class PowerPellet(Pellet):
@@ -27,45 +38,113 @@ class PowerPellet(Pellet):
         self.radius = int(8 * TILEWIDTH / 16)
         self.points = 50
         self.flashTime = 0.2
-        self.timer= 0
-        
-    def update(self, dt):
-        self.timer += dt
-        if self.timer >= self.flashTime:
-            self.visible = not self.visible
-            self.timer = 0
+
+    def flash(self):
+        self.visible = not self.visible
 
 
 class PelletGroup(object):
-    def __init__(self, pelletfile):
-        self.pelletList = []
+    def __init__(self, pelletfile, timers):
+        self.timers = timers
+        self.timer = None
+        self.pelletLUT = {}
         self.powerpellets = []
+        self.layer = None
+        self.dirtyRects = []
         self.createPelletList(pelletfile)
+        self.collideRadius = max([p.collideRadius for p in self.pelletLUT.values()] + [0])
         self.numEaten = 0
+        self.startFlashing()
+
+    def startFlashing(self):
+        self.stopFlashing()
+        if len(self.powerpellets) > 0:
+            self.timer = self.timers.schedule(self.powerpellets[0].flashTime, self.flash)
 
-    def update(self, dt):
+    def stopFlashing(self):
+        self.timers.cancel(self.timer)
+        self.timer = None
+
+    def flash(self):
         for powerpellet in self.powerpellets:
-            powerpellet.update(dt)
-                
+            powerpellet.flash()
+        self.timer = None
+        self.startFlashing()
+
     def createPelletList(self, pelletfile):
-        data = self.readPelletfile(pelletfile)        
+        for row, col, name in mazes.getCompiled("pellets", pelletfile, self.buildLayout).tolist():
+            if name == PELLET:
+                self.pelletLUT[(row, col)] = Pellet(row, col)
+            else:
+                pp = PowerPellet(row, col)
+                self.pelletLUT[(row, col)] = pp
+                self.powerpellets.append(pp)
+
+    def buildLayout(self, pelletfile):
+        data = self.readPelletfile(pelletfile)
+        layout = []
         for row in range(data.shape[0]):
             for col in range(data.shape[1]):
                 if data[row][col] in ['.', '+']:
-                    self.pelletList.append(Pellet(row, col))
+                    layout.append((row, col, PELLET))
                 elif data[row][col] in ['P', 'p']:
-                    pp = PowerPellet(row, col)
-                    self.pelletList.append(pp)
-                    self.powerpellets.append(pp)
-                    
+                    layout.append((row, col, POWERPELLET))
+        return np.array(layout, dtype=np.int32).reshape(-1, 3)
+
     def readPelletfile(self, textfile):
-        return np.loadtxt(textfile, dtype='<U1')
+        return mazes.getGrid(textfile)
     
+    def getNearbyPellets(self, entity):
+        return self.getPelletsBetween(entity, entity.position, entity.position)
+
+    def getPelletsAlong(self, entity):
+        return self.getPelletsBetween(entity, entity.position, entity.target.position)
+
+    def getPelletsBetween(self, entity, start, end):
+        radius = entity.collideRadius + self.collideRadius
+        x0, x1 = sorted((start.x, end.x))
+        y0, y1 = sorted((start.y, end.y))
+        cols = range(int(math.ceil((x0 - radius) / TILEWIDTH)), int(math.floor((x1 + radius) / TILEWIDTH)) + 1)
+        for row in range(int(math.ceil((y0 - radius) / TILEHEIGHT)), int(math.floor((y1 + radius) / TILEHEIGHT)) + 1):
+            for col in cols:
+                pellet = self.pelletLUT.get((row, col))
+                if pellet is not None:
+                    yield pellet
+
+    def removePellet(self, pellet):
+        del self.pelletLUT[(pellet.row, pellet.column)]
+        if pellet.name == POWERPELLET:
+            self.powerpellets.remove(pellet)
+        elif self.layer is not None:
+            pellet.erase(self.layer)
+            self.dirtyRects.append(pellet.getRect())
+
+    def getState(self):
+        return (self.numEaten, tuple(self.pelletLUT.items()))
+
+    def setState(self, state):
+        self.numEaten, pellets = state
+        self.pelletLUT = dict(pellets)
+        self.powerpellets = [p for p in self.pelletLUT.values() if p.name == POWERPELLET]
+        self.layer = None
+        self.startFlashing()
+
     def isEmpty(self):
-        if len(self.pelletList) == 0:
+        if len(self.pelletLUT) == 0:
             return True
         return False
     
+    def createLayer(self, screen):
+        self.layer = pygame.Surface(screen.get_size()).convert()
+        self.layer.fill(BLACK)
+        self.layer.set_colorkey(BLACK)
+        for pellet in self.pelletLUT.values():
+            if pellet.name != POWERPELLET:
+                pellet.render(self.layer)
+
     def render(self, screen):
-        for pellet in self.pelletList:
-            pellet.render(screen)
\ No newline at end of file
+        if self.layer is None:
+            self.createLayer(screen)
+        screen.blit(self.layer, (0, 0))
+        for powerpellet in self.powerpellets:
+            powerpellet.render(screen)
\ No newline at end of file
@@ -1,3 +1,5 @@
+import os
+import math
 import pygame
 from pygame.locals import *
 from constants import *
@@ -7,53 +9,88 @@ from pellets import PelletGroup
 from ghosts import GhostGroup
 from fruit import Fruit
 from pauser import Pause
+from timers import Scheduler
 from text import TextGroup
 from sprites import LifeSprites
 from sprites import MazeSprites
 from mazedata import MazeData
 
 class GameController(object):
-    def __init__(self):
+    def __init__(self, headless=False, tickrate=TICKRATE, fixedpoint=False):
+        self.headless = headless
+        self.scale = 1
+        if fixedpoint:
+            self.scale = TIMEUNITS
+        self.timestep = 1.0 / tickrate
+        self.accumulator = 0
+        if headless:
+            os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
         pygame.init()
-        self.screen = pygame.display.set_mode(SCREENSIZE, 0, 32)
+        self.screen = None
+        if not headless:
+            self.screen = pygame.display.set_mode(SCREENSIZE, 0, 32)
         self.background = None
         self.background_norm = None
         self.background_flash = None
+        self.fullRedraw = True
+        self.sprites = {}
+        self.hud = None
+        self.hudRect = None
+        self.hudKey = None
         self.clock = pygame.time.Clock()
+        self.timers = Scheduler(self.scale)
+        self.simtimers = Scheduler(self.scale)
         self.fruit = None
-        self.pause = Pause(True)
+        self.pellets = None
+        self.pause = Pause(self.timers, True)
         self.level = 0
         self.lives = 5
         self.score = 0
-        self.textgroup = TextGroup()
+        self.textgroup = TextGroup(self.timers)
         self.lifesprites = LifeSprites(self.lives)
         self.flashBG = False
         self.flashTime = 0.2
-        self.flashTimer = 0
+        self.flashTimer = None
         self.fruitCaptured = []
         self.fruitNode = None
         self.mazedata = MazeData()
 
     def setBackground(self):
-        self.background_norm = pygame.surface.Surface(SCREENSIZE).convert()
-        self.background_norm.fill(BLACK)
-        self.background_flash = pygame.surface.Surface(SCREENSIZE).convert()
-        self.background_flash.fill(BLACK)
-        self.background_norm = self.mazesprites.constructBackground(self.background_norm, self.level%5)
-        self.background_flash = self.mazesprites.constructBackground(self.background_flash, 5)
         self.flashBG = False
+        self.setFlashTimer(None)
+        self.fullRedraw = True
+        if self.headless:
+            return
+        self.background_norm = self.mazesprites.getBackground(self.level%5)
+        self.background_flash = self.mazesprites.getBackground(5)
         self.background = self.background_norm
 
+    def setFlashTimer(self, deadline):
+        self.timers.cancel(self.flashTimer)
+        self.flashTimer = None
+        if deadline is not None:
+            self.flashTimer = self.timers.scheduleAt(deadline, self.flashBackground)
+
+    def flashBackground(self):
+        if self.background == self.background_norm:
+            self.background = self.background_flash
+        else:
+            self.background = self.background_norm
+        self.setFlashTimer(self.timers.timeAfter(self.flashTime))
+
     def startGame(self):      
+        self.simtimers.clear()
+        if self.pellets is not None:
+            self.pellets.stopFlashing()
         self.mazedata.loadMaze(self.level)
         self.mazesprites = MazeSprites(self.mazedata.obj.name+".txt", self.mazedata.obj.name+"_rotation.txt")
         self.setBackground()
         self.nodes = NodeGroup(self.mazedata.obj.name+".txt")
         self.mazedata.obj.setPortalPairs(self.nodes)
         self.mazedata.obj.connectHomeNodes(self.nodes)
-        self.pacman = Pacman(self.nodes.getNodeFromTiles(*self.mazedata.obj.pacmanStart))
-        self.pellets = PelletGroup(self.mazedata.obj.name+".txt")
-        self.ghosts = GhostGroup(self.nodes.getStartTempNode(), self.pacman)
+        self.pacman = Pacman(self.nodes.getNodeFromTiles(*self.mazedata.obj.pacmanStart), self.scale)
+        self.pellets = PelletGroup(self.mazedata.obj.name+".txt", self.timers)
+        self.ghosts = GhostGroup(self.nodes.getStartTempNode(), self.pacman, self.simtimers)
 
         self.ghosts.pinky.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(2, 3)))
         self.ghosts.inky.setStartNode(self.nodes.getNodeFromTiles(*self.mazedata.obj.addOffset(0, 3)))
@@ -76,9 +113,9 @@ class GameController(object):
         homekey = self.nodes.createHomeNodes(11.5, 14)
         self.nodes.connectHomeNodes(homekey, (12,14), LEFT)
         self.nodes.connectHomeNodes(homekey, (15,14), RIGHT)
-        self.pacman = Pacman(self.nodes.getNodeFromTiles(15, 26))
-        self.pellets = PelletGroup("maze1.txt")
-        self.ghosts = GhostGroup(self.nodes.getStartTempNode(), self.pacman)
+        self.pacman = Pacman(self.nodes.getNodeFromTiles(15, 26), self.scale)
+        self.pellets = PelletGroup("maze1.txt", self.timers)
+        self.ghosts = GhostGroup(self.nodes.getStartTempNode(), self.pacman, self.simtimers)
         self.ghosts.blinky.setStartNode(self.nodes.getNodeFromTiles(2+11.5, 0+14))
         self.ghosts.pinky.setStartNode(self.nodes.getNodeFromTiles(2+11.5, 3+14))
         self.ghosts.inky.setStartNode(self.nodes.getNodeFromTiles(0+11.5, 3+14))
@@ -98,38 +135,104 @@ class GameController(object):
 
         
 
-    def update(self):
-        dt = self.clock.tick(30) / 1000.0
-        self.textgroup.update(dt)
-        self.pellets.update(dt)
+    def update(self, dt=None):
+        if self.headless:
+            if dt is None:
+                dt = self.timestep
+            self.advance(dt)
+        else:
+            limit = MAXFRAMETIME
+            if dt is None:
+                if self.isIdle():
+                    timeout = self.getIdleTimeout()
+                    self.waitForEvent(timeout)
+                    if timeout is not None:
+                        limit += timeout
+                    dt = self.clock.tick() / 1000.0
+                else:
+                    dt = self.clock.tick(FRAMERATE) / 1000.0
+            self.accumulator += min(dt, limit)
+            while self.accumulator >= self.timestep:
+                self.step(self.timestep)
+                self.accumulator -= self.timestep
+            self.checkEvents()
+            self.render(self.accumulator / self.timestep)
+
+    def advance(self, dt):
+        self.step(dt)
+        if self.pause.paused and self.pause.pauseTime is None:
+            self.togglePause()
+
+    def skip(self, maxTime=None):
+        dt = self.getEventTime()
+        if dt is None:
+            dt = self.timestep
+        else:
+            dt += EVENTEPSILON
+        dt = self.simtimers.toUnits(dt)
+        if maxTime is not None:
+            dt = min(dt, self.simtimers.toUnitsWithin(maxTime))
+        dt = dt / self.scale
+        self.advance(dt)
+        return dt
+
+    def getEventTime(self):
+        if self.pause.paused:
+            return self.timers.timeLeft()
+        times = [self.simtimers.timeLeft(), self.pacman.timeToTarget()]
+        for ghost in self.ghosts:
+            times.append(ghost.timeToTarget())
+            if self.pacman.alive:
+                times.append(self.pacman.timeToCollide(ghost, ghost.getVelocity()))
+        if self.pacman.alive:
+            if self.fruit is not None:
+                times.append(self.pacman.timeToCollide(self.fruit))
+            for pellet in self.pellets.getPelletsAlong(self.pacman):
+                times.append(self.pacman.timeToCollide(pellet))
+        times = [t for t in times if t is not None]
+        if len(times) == 0:
+            return None
+        return min(times)
+
+    def isIdle(self):
+        return self.pause.paused and self.pacman.alive
+
+    def getIdleTimeout(self):
+        timeLeft = self.timers.timeLeft()
+        if timeLeft is None:
+            return None
+        ticks = max(math.ceil(timeLeft / self.timestep - 1e-6), 1)
+        return max(ticks * self.timestep - self.accumulator, 0)
+
+    def waitForEvent(self, timeout):
+        if timeout is None:
+            event = pygame.event.wait()
+        else:
+            event = pygame.event.wait(max(int(math.ceil(timeout * 1000)), 1))
+        if event.type != NOEVENT:
+            pygame.event.post(event)
+
+    def step(self, dt):
+        dt = self.simtimers.toUnits(dt)
         if not self.pause.paused:
+            self.simtimers.update(dt)
             self.ghosts.update(dt)      
-            if self.fruit is not None:
-                self.fruit.update(dt)
             self.checkPelletEvents()
             self.checkGhostEvents()
             self.checkFruitEvents()
+        else:
+            for ghost in self.ghosts:
+                ghost.setPrevious()
 
         if self.pacman.alive:
             if not self.pause.paused:
                 self.pacman.update(dt)
+            else:
+                self.pacman.setPrevious()
         else:
             self.pacman.update(dt)
 
-        if self.flashBG:
-            self.flashTimer += dt
-            if self.flashTimer >= self.flashTime:
-                self.flashTimer = 0
-                if self.background == self.background_norm:
-                    self.background = self.background_flash
-                else:
-                    self.background = self.background_norm
-
-        afterPauseMethod = self.pause.update(dt)
-        if afterPauseMethod is not None:
-            afterPauseMethod()
-        self.checkEvents()
-        self.render()
+        self.timers.update(dt)
 
     def checkEvents(self):
         for event in pygame.event.get():
@@ -137,17 +240,20 @@ class GameController(object):
                 exit()
             elif event.type == KEYDOWN:
                 if event.key == K_SPACE:
-                    if self.pacman.alive:
-                        self.pause.setPause(playerPaused=True)
-                        if not self.pause.paused:
-                            self.textgroup.hideText()
-                            self.showEntities()
-                        else:
-                            self.textgroup.showText(PAUSETXT)
-                            #self.hideEntities()
+                    self.togglePause()
+
+    def togglePause(self):
+        if self.pacman.alive:
+            self.pause.setPause(playerPaused=True)
+            if not self.pause.paused:
+                self.textgroup.hideText()
+                self.showEntities()
+            else:
+                self.textgroup.showText(PAUSETXT)
+                #self.hideEntities()
 
     def checkPelletEvents(self):
-        pellet = self.pacman.eatPellets(self.pellets.pelletList)
+        pellet = self.pacman.eatPellets(self.pellets.getNearbyPellets(self.pacman))
         if pellet:
             self.pellets.numEaten += 1
             self.updateScore(pellet.points)
@@ -155,11 +261,12 @@ class GameController(object):
                 self.ghosts.inky.startNode.allowAccess(RIGHT, self.ghosts.inky)
             if self.pellets.numEaten == 70:
                 self.ghosts.clyde.startNode.allowAccess(LEFT, self.ghosts.clyde)
-            self.pellets.pelletList.remove(pellet)
+            self.pellets.removePellet(pellet)
             if pellet.name == POWERPELLET:
                 self.ghosts.startFreight()
             if self.pellets.isEmpty():
                 self.flashBG = True
+                self.setFlashTimer(self.timers.timeAfter(self.flashTime))
                 self.hideEntities()
                 self.pause.setPause(pauseTime=3, func=self.nextLevel)
 
@@ -190,7 +297,7 @@ class GameController(object):
     def checkFruitEvents(self):
         if self.pellets.numEaten == 50 or self.pellets.numEaten == 140:
             if self.fruit is None:
-                self.fruit = Fruit(self.nodes.getNodeFromTiles(9, 20), self.level)
+                self.fruit = Fruit(self.nodes.getNodeFromTiles(9, 20), self.simtimers, self.level)
                 print(self.fruit)
         if self.fruit is not None:
             if self.pacman.collideCheck(self.fruit):
@@ -246,27 +353,139 @@ class GameController(object):
         self.score += points
         self.textgroup.updateScore(self.score)
 
-    def render(self):
-        self.screen.blit(self.background, (0, 0))
-        #self.nodes.render(self.screen)
-        self.pellets.render(self.screen)
+    def snapshot(self):
+        fruit = None
         if self.fruit is not None:
-            self.fruit.render(self.screen)
-        self.pacman.render(self.screen)
-        self.ghosts.render(self.screen)
-        self.textgroup.render(self.screen)
+            fruit = (self.fruit, self.fruit.destroy, self.simtimers.getDeadline(self.fruit.timer))
+        return (self.level, self.score, self.lives, self.timers.time, self.simtimers.time,
+                self.pause.getState(), self.textgroup.getState(),
+                self.pacman.getState(self.nodes), tuple(ghost.getState(self.nodes) for ghost in self.ghosts),
+                self.pellets.getState(), self.nodes.getAccessState(), fruit, tuple(self.fruitCaptured),
+                self.flashBG, self.timers.getDeadline(self.flashTimer), self.background is not self.background_norm)
+
+    def restore(self, snap):
+        (level, score, lives, self.timers.time, self.simtimers.time, pause, text, pacman, ghosts,
+         pellets, access, fruit, fruitCaptured, flashBG, flashTimer, flashing) = snap
+        self.simtimers.clear()
+        if level != self.level:
+            self.level = level
+            self.startGame()
+            self.textgroup.updateLevel(self.level)
+        if score != self.score:
+            self.score = score
+            self.textgroup.updateScore(self.score)
+        if lives != self.lives:
+            self.lives = lives
+            self.lifesprites.resetLives(self.lives)
+        self.pause.setState(pause)
+        self.textgroup.setState(text)
+        self.pacman.setState(pacman, self.nodes)
+        for ghost, state in zip(self.ghosts, ghosts):
+            ghost.setState(state, self.nodes)
+        self.pellets.setState(pellets)
+        self.nodes.setAccessState(access)
+        self.fruit = None
+        if fruit is not None:
+            self.fruit, self.fruit.destroy, deadline = fruit
+            self.fruit.setTimer(deadline)
+        self.fruitCaptured = list(fruitCaptured)
+        self.flashBG = flashBG
+        self.setFlashTimer(flashTimer)
+        if flashing:
+            self.background = self.background_flash
+        else:
+            self.background = self.background_norm
+        self.fullRedraw = True
 
+    def getHudImages(self):
+        images = []
         for i in range(len(self.lifesprites.images)):
             x = self.lifesprites.images[i].get_width() * i
             y = SCREENHEIGHT - self.lifesprites.images[i].get_height()
-            self.screen.blit(self.lifesprites.images[i], (x, y))
+            images.append((self.lifesprites.images[i], (x, y)))
 
         for i in range(len(self.fruitCaptured)):
             x = SCREENWIDTH - self.fruitCaptured[i].get_width() * (i+1)
             y = SCREENHEIGHT - self.fruitCaptured[i].get_height()
-            self.screen.blit(self.fruitCaptured[i], (x, y))
+            images.append((self.fruitCaptured[i], (x, y)))
+        return images
 
-        pygame.display.update()
+    def getHud(self):
+        key = (tuple(self.lifesprites.images), tuple(self.fruitCaptured))
+        if key != self.hudKey:
+            self.hudKey = key
+            self.hud = None
+            images = self.getHudImages()
+            if len(images) > 0:
+                rects = [pygame.Rect(position, image.get_size()) for image, position in images]
+                self.hudRect = rects[0].unionall(rects[1:])
+                self.hud = pygame.Surface(self.hudRect.size, SRCALPHA, 32)
+                for image, (x, y) in images:
+                    self.hud.blit(image, (x - self.hudRect.x, y - self.hudRect.y))
+        return self.hud
+
+    def getSprites(self, alpha):
+        sprites = {}
+        for entity in [self.fruit, self.pacman] + self.ghosts.ghosts:
+            if entity is not None and entity.visible:
+                sprites[entity] = (entity.getRect(alpha), entity.image)
+        for pellet in self.pellets.powerpellets:
+            if pellet.visible:
+                sprites[pellet] = (pellet.getRect(), None)
+        for text in self.textgroup.alltext.values():
+            if text.visible:
+                sprites[text] = (text.getRect(), text.label, text.text)
+        if self.getHud() is not None:
+            sprites[self.hudKey] = (self.hudRect, self.hud)
+        return sprites
+
+    def getDirtyRects(self, sprites):
+        rects = self.pellets.dirtyRects
+        self.pellets.dirtyRects = []
+        for key in set(self.sprites) | set(sprites):
+            old = self.sprites.get(key)
+            new = sprites.get(key)
+            if old != new:
+                if old is not None:
+                    rects.append(old[0])
+                if new is not None:
+                    rects.append(new[0])
+        merged = []
+        for rect in rects:
+            index = rect.collidelist(merged)
+            while index != -1:
+                rect = rect.union(merged.pop(index))
+                index = rect.collidelist(merged)
+            merged.append(rect)
+        return merged
+
+    def render(self, alpha=1.0):
+        sprites = self.getSprites(alpha)
+        if self.fullRedraw or self.flashBG:
+            self.draw(alpha)
+            self.pellets.dirtyRects = []
+            self.fullRedraw = False
+            pygame.display.update()
+        else:
+            rects = self.getDirtyRects(sprites)
+            for rect in rects:
+                self.screen.set_clip(rect)
+                self.draw(alpha)
+            self.screen.set_clip(None)
+            pygame.display.update(rects)
+        self.sprites = sprites
+
+    def draw(self, alpha):
+        self.screen.blit(self.background, (0, 0))
+        #self.nodes.render(self.screen)
+        self.pellets.render(self.screen)
+        if self.fruit is not None:
+            self.fruit.render(self.screen)
+        self.pacman.render(self.screen, alpha)
+        self.ghosts.render(self.screen, alpha)
+        self.textgroup.render(self.screen)
+        if self.getHud() is not None:
+            self.screen.blit(self.hud, self.hudRect)
 
 
 if __name__ == "__main__":
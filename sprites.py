@@ -1,26 +1,49 @@
+import os
 import pygame
 from constants import *
 import numpy as np
 from animation import Animator
+from mazerepo import mazes
 
 BASETILEWIDTH = 16
 BASETILEHEIGHT = 16
 DEATH = 5
+SHEETFILE = "spritesheet_mspacman.png"
+
+sheets = {}
+atlases = {}
+backgrounds = {}
+
+def loadSpritesheet(filename=SHEETFILE):
+    converted = pygame.display.get_surface() is not None
+    key = (filename, TILEWIDTH, TILEHEIGHT, converted)
+    if key not in sheets:
+        sheet = pygame.image.load(filename)
+        if converted:
+            sheet = sheet.convert()
+        transcolor = sheet.get_at((0,0))
+        sheet.set_colorkey(transcolor)
+        width = int(sheet.get_width() / BASETILEWIDTH * TILEWIDTH)
+        height = int(sheet.get_height() / BASETILEHEIGHT * TILEHEIGHT)
+        sheets[key] = pygame.transform.scale(sheet, (width, height))
+        atlases[key] = {}
+    return sheets[key], atlases[key]
+
+def invalidateSpritesheets():
+    sheets.clear()
+    atlases.clear()
+    backgrounds.clear()
+
 
 class Spritesheet(object):
     def __init__(self):
-        self.sheet = pygame.image.load("spritesheet_mspacman.png").convert()
-        transcolor = self.sheet.get_at((0,0))
-        self.sheet.set_colorkey(transcolor)
-        width = int(self.sheet.get_width() / BASETILEWIDTH * TILEWIDTH)
-        height = int(self.sheet.get_height() / BASETILEHEIGHT * TILEHEIGHT)
-        self.sheet = pygame.transform.scale(self.sheet, (width, height))
-        
+        self.sheet, self.atlas = loadSpritesheet()
+
     def getImage(self, x, y, width, height):
-        x *= TILEWIDTH
-        y *= TILEHEIGHT
-        self.sheet.set_clip(pygame.Rect(x, y, width, height))
-        return self.sheet.subsurface(self.sheet.get_clip())
+        key = (x, y, width, height)
+        if key not in self.atlas:
+            self.atlas[key] = self.sheet.subsurface(pygame.Rect(x*TILEWIDTH, y*TILEHEIGHT, width, height))
+        return self.atlas[key]
 
 
 class PacmanSprites(Spritesheet):
@@ -38,6 +61,9 @@ class PacmanSprites(Spritesheet):
         self.animations[UP] = Animator(((10,2), (6, 0), (6, 2), (6, 0)))
         self.animations[DOWN] = Animator(((8,2), (4, 0), (4, 2), (4, 0)))
         self.animations[DEATH] = Animator(((0, 12), (2, 12), (4, 12), (6, 12), (8, 12), (10, 12), (12, 12), (14, 12), (16, 12), (18, 12), (20, 12)), speed=6, loop=False)
+        for animation in self.animations.values():
+            for frame in animation.frames:
+                self.getImage(*frame)
 
     def update(self, dt):
         if self.entity.alive == True:
@@ -75,6 +101,10 @@ class GhostSprites(Spritesheet):
         self.x = {BLINKY:0, PINKY:2, INKY:4, CLYDE:6}
         self.entity = entity
         self.entity.image = self.getStartImage()
+        for x in (self.x[self.entity.name], 8):
+            for y in (4, 6, 8, 10):
+                self.getImage(x, y)
+        self.getImage(10, 4)
 
     def update(self, dt):
         x = self.x[self.entity.name]
@@ -141,6 +171,8 @@ class LifeSprites(Spritesheet):
 class MazeSprites(Spritesheet):
     def __init__(self, mazefile, rotfile):
         Spritesheet.__init__(self)
+        self.mazefile = mazefile
+        self.rotfile = rotfile
         self.data = self.readMazeFile(mazefile)
         self.rotdata = self.readMazeFile(rotfile)
 
@@ -148,22 +180,49 @@ class MazeSprites(Spritesheet):
         return Spritesheet.getImage(self, x, y, TILEWIDTH, TILEHEIGHT)
 
     def readMazeFile(self, mazefile):
-        return np.loadtxt(mazefile, dtype='<U1')
+        return mazes.getGrid(mazefile)
+
+    def getBackground(self, y):
+        key = (self.mazefile, self.rotfile, SHEETFILE, y, TILEWIDTH, TILEHEIGHT)
+        if key not in backgrounds:
+            backgrounds[key] = self.loadBackground(y)
+        return backgrounds[key]
+
+    def loadBackground(self, y):
+        path = None
+        if mazes.cachedir is not None:
+            path = mazes.getCachePath(self.mazefile, "bg%d.%dx%d.png" % (y, TILEWIDTH, TILEHEIGHT))
+            if mazes.isCurrent(path, [self.mazefile, self.rotfile, SHEETFILE]):
+                return pygame.image.load(path).convert()
+        background = pygame.surface.Surface(SCREENSIZE).convert()
+        background.fill(BLACK)
+        background = self.constructBackground(background, y)
+        if path is not None:
+            mazes.writeFile(path, lambda f: pygame.image.save(background, f, os.path.basename(path)))
+            mazes.writeSignature(path, [self.mazefile, self.rotfile, SHEETFILE])
+        return background
 
     def constructBackground(self, background, y):
-        for row in list(range(self.data.shape[0])):
-            for col in list(range(self.data.shape[1])):
-                if self.data[row][col].isdigit():
-                    x = int(self.data[row][col]) + 12
-                    sprite = self.getImage(x, y)
-                    rotval = int(self.rotdata[row][col])
-                    sprite = self.rotate(sprite, rotval)
-                    background.blit(sprite, (col*TILEWIDTH, row*TILEHEIGHT))
-                elif self.data[row][col] == '=':
-                    sprite = self.getImage(10, 8)
-                    background.blit(sprite, (col*TILEWIDTH, row*TILEHEIGHT))
-
+        tiles = mazes.getTiles(self.mazefile).astype(np.int32) - ord('0')
+        rotations = mazes.getTiles(self.rotfile).astype(np.int32) - ord('0')
+        sprites = [self.getRotatedImage(digit + 12, y, rotval) for digit in range(10) for rotval in range(4)]
+
+        rows, cols = np.nonzero((tiles >= 0) & (tiles <= 9))
+        codes = tiles[rows, cols] * 4 + rotations[rows, cols] % 4
+        blits = [(sprites[code], (col*TILEWIDTH, row*TILEHEIGHT))
+                 for code, row, col in zip(codes.tolist(), rows.tolist(), cols.tolist())]
+
+        wall = self.getImage(10, 8)
+        rows, cols = np.nonzero(tiles == ord('=') - ord('0'))
+        blits += [(wall, (col*TILEWIDTH, row*TILEHEIGHT)) for row, col in zip(rows.tolist(), cols.tolist())]
+        background.blits(blits, doreturn=False)
         return background
 
+    def getRotatedImage(self, x, y, rotval):
+        key = (x, y, TILEWIDTH, TILEHEIGHT, rotval)
+        if key not in self.atlas:
+            self.atlas[key] = self.rotate(self.getImage(x, y), rotval)
+        return self.atlas[key]
+
     def rotate(self, sprite, value):
         return pygame.transform.rotate(sprite, value*90)
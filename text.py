@@ -1,7 +1,40 @@
 import pygame
+from pygame.locals import *
+from collections import OrderedDict
+from functools import partial
 from vector import Vector2
 from constants import *
 
+FONTFILE = "PressStart2P-Regular.ttf"
+LABELCACHESIZE = 256
+
+fonts = {}
+labels = OrderedDict()
+glyphs = {}
+
+def getFont(fontpath, size):
+    key = (fontpath, size)
+    if key not in fonts:
+        fonts[key] = pygame.font.Font(fontpath, size)
+    return fonts[key]
+
+def getLabel(fontpath, text, color, size):
+    key = (fontpath, text, color, size)
+    if key in labels:
+        labels.move_to_end(key)
+    else:
+        labels[key] = getFont(fontpath, size).render(text, 1, color)
+        if len(labels) > LABELCACHESIZE:
+            labels.popitem(last=False)
+    return labels[key]
+
+def getGlyphs(fontpath, color, size):
+    key = (fontpath, color, size)
+    if key not in glyphs:
+        font = getFont(fontpath, size)
+        glyphs[key] = {digit:font.render(digit, 1, color) for digit in "0123456789"}
+    return glyphs[key]
+
 class Text(object):
     def __init__(self, text, color, x, y, size, time=None, id=None, visible=True):
         self.id = id
@@ -10,30 +43,24 @@ class Text(object):
         self.size = size
         self.visible = visible
         self.position = Vector2(x, y)
-        self.timer = 0
         self.lifespan = time
         self.label = None
-        self.destroy = False
-        self.setupFont("PressStart2P-Regular.ttf")
+        self.setupFont(FONTFILE)
         self.createLabel()
 
     def setupFont(self, fontpath):
-        self.font = pygame.font.Font(fontpath, self.size)
+        self.fontpath = fontpath
+        self.font = getFont(fontpath, self.size)
 
     def createLabel(self):
-        self.label = self.font.render(self.text, 1, self.color)
+        self.label = getLabel(self.fontpath, self.text, self.color, self.size)
 
     def setText(self, newtext):
         self.text = str(newtext)
         self.createLabel()
 
-    def update(self, dt):
-        if self.lifespan is not None:
-            self.timer += dt
-            if self.timer >= self.lifespan:
-                self.timer = 0
-                self.lifespan = None
-                self.destroy = True
+    def getRect(self):
+        return pygame.Rect(self.position.asInt(), self.label.get_size()).inflate(2, 2)
 
     def render(self, screen):
         if self.visible:
@@ -41,37 +68,59 @@ class Text(object):
             screen.blit(self.label, (x, y))
 
 
+class NumberText(Text):
+    def __init__(self, text, color, x, y, size, time=None, id=None, visible=True):
+        self.digits = None
+        Text.__init__(self, text, color, x, y, size, time=time, id=id, visible=visible)
+
+    def createLabel(self):
+        if not self.text.isdigit():
+            self.digits = None
+            Text.createLabel(self)
+            return
+        if self.digits is None or len(self.digits) != len(self.text):
+            self.offsets = [self.font.size(self.text[:i])[0] for i in range(len(self.text)+1)]
+            self.label = pygame.Surface(self.font.size(self.text), pygame.SRCALPHA, 32)
+            self.digits = " " * len(self.text)
+        atlas = getGlyphs(self.fontpath, self.color, self.size)
+        for i in range(len(self.text)):
+            if self.digits[i] != self.text[i]:
+                cell = pygame.Rect(self.offsets[i], 0, self.offsets[i+1] - self.offsets[i], self.label.get_height())
+                self.label.fill((0, 0, 0, 0), cell)
+                self.label.blit(atlas[self.text[i]], cell, special_flags=BLEND_RGBA_MAX)
+        self.digits = self.text
+
+
 class TextGroup(object):
-    def __init__(self):
+    def __init__(self, timers):
+        self.timers = timers
         self.nextid = 10
         self.alltext = {}
+        self.timed = {}
         self.setupText()
         self.showText(READYTXT)
 
     def addText(self, text, color, x, y, size, time=None, id=None):
         self.nextid += 1
         self.alltext[self.nextid] = Text(text, color, x, y, size, time=time, id=id)
+        if time is not None:
+            self.timed[self.nextid] = self.timers.schedule(time, partial(self.removeText, self.nextid))
         return self.nextid
 
     def removeText(self, id):
+        self.timers.cancel(self.timed.pop(id, None))
         self.alltext.pop(id)
         
     def setupText(self):
         size = TILEHEIGHT
-        self.alltext[SCORETXT] = Text("0".zfill(8), WHITE, 0, TILEHEIGHT, size)
-        self.alltext[LEVELTXT] = Text(str(1).zfill(3), WHITE, 23*TILEWIDTH, TILEHEIGHT, size)
+        self.alltext[SCORETXT] = NumberText("0".zfill(8), WHITE, 0, TILEHEIGHT, size)
+        self.alltext[LEVELTXT] = NumberText(str(1).zfill(3), WHITE, 23*TILEWIDTH, TILEHEIGHT, size)
         self.alltext[READYTXT] = Text("READY!", YELLOW, 11.25*TILEWIDTH, 20*TILEHEIGHT, size, visible=False)
         self.alltext[PAUSETXT] = Text("PAUSED!", YELLOW, 10.625*TILEWIDTH, 20*TILEHEIGHT, size, visible=False)
         self.alltext[GAMEOVERTXT] = Text("GAMEOVER!", YELLOW, 10*TILEWIDTH, 20*TILEHEIGHT, size, visible=False)
         self.addText("SCORE", WHITE, 0, 0, size)
         self.addText("LEVEL", WHITE, 23*TILEWIDTH, 0, size)
 
-    def update(self, dt):
-        for tkey in list(self.alltext.keys()):
-            self.alltext[tkey].update(dt)
-            if self.alltext[tkey].destroy:
-                self.removeText(tkey)
-
     def showText(self, id):
         self.hideText()
         self.alltext[id].visible = True
@@ -81,6 +130,15 @@ class TextGroup(object):
         self.alltext[PAUSETXT].visible = False
         self.alltext[GAMEOVERTXT].visible = False
 
+    def getState(self):
+        return tuple(self.alltext[tkey].visible for tkey in (READYTXT, PAUSETXT, GAMEOVERTXT))
+
+    def setState(self, state):
+        for tkey, visible in zip((READYTXT, PAUSETXT, GAMEOVERTXT), state):
+            self.alltext[tkey].visible = visible
+        for tkey in list(self.timed.keys()):
+            self.removeText(tkey)
+
     def updateScore(self, score):
         self.updateText(SCORETXT, str(score).zfill(8))
 
@@ -0,0 +1,56 @@
+import heapq
+import math
+
+class Scheduler(object):
+    def __init__(self, scale=1):
+        self.scale = scale
+        self.time = 0
+        self.queue = []
+        self.deadlines = {}
+        self.nextid = 0
+
+    def toUnits(self, seconds):
+        if self.scale == 1:
+            return seconds
+        return int(math.ceil(seconds * self.scale - 0.000001))
+
+    def toUnitsWithin(self, seconds):
+        if self.scale == 1:
+            return seconds
+        return max(int(seconds * self.scale), 1)
+
+    def timeAfter(self, delay):
+        return self.time + self.toUnits(delay)
+
+    def schedule(self, delay, callback):
+        return self.scheduleAt(self.timeAfter(delay), callback)
+
+    def scheduleAt(self, deadline, callback):
+        self.nextid += 1
+        self.deadlines[self.nextid] = deadline
+        heapq.heappush(self.queue, (deadline, self.nextid, callback))
+        return self.nextid
+
+    def cancel(self, timerid):
+        self.deadlines.pop(timerid, None)
+
+    def getDeadline(self, timerid):
+        return self.deadlines.get(timerid)
+
+    def update(self, dt):
+        self.time += dt
+        while len(self.queue) > 0 and self.queue[0][0] <= self.time:
+            deadline, timerid, callback = heapq.heappop(self.queue)
+            if self.deadlines.pop(timerid, None) is not None:
+                callback()
+
+    def timeLeft(self):
+        while len(self.queue) > 0 and self.queue[0][1] not in self.deadlines:
+            heapq.heappop(self.queue)
+        if len(self.queue) > 0:
+            return (self.queue[0][0] - self.time) / self.scale
+        return None
+
+    def clear(self):
+        self.queue = []
+        self.deadlines = {}
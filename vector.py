@@ -32,6 +32,9 @@ class Vector2(object):
                 return True
         return False
 
+    def dot(self, other):
+        return self.x * other.x + self.y * other.y
+
     def magnitudeSquared(self):
         return self.x**2 + self.y**2
 